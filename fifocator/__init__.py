@@ -1,5 +1,7 @@
 #!/usr/bin/python3
 
-from .fifocator import Fifo, Quit
-__all__ = [ 'Fifo', 'Quit' ]
+from .fifocator import FifoClient, FifoDoesNotExistError, FifoWorker, NotFifoError, Quit
+from .fifocator import SharedRingClient, SharedRingFifo
+__all__ = [ 'FifoClient', 'FifoDoesNotExistError', 'FifoWorker', 'NotFifoError', 'Quit',
+            'SharedRingClient', 'SharedRingFifo' ]
 __version__ = '0.1'
@@ -0,0 +1,76 @@
+# cython: language_level=3, boundscheck=False, wraparound=False
+#
+#    fifocator - Named Pipes Made Easy
+#    Copyright (c) 2018 - 2019 Avner Herskovits
+#
+#    MIT License, see fifocator.py
+#
+#    Compiled version of fifocator._drain, the worker's per-wakeup read and
+#    tokenize loop. Behaves exactly like the pure python version.
+#
+from cpython.bytearray cimport PyByteArray_AS_STRING, PyByteArray_GET_SIZE
+from cpython.exc cimport PyErr_CheckSignals, PyErr_SetFromErrno
+from cpython.unicode cimport PyUnicode_DecodeUTF8
+from libc.errno cimport EAGAIN, EINTR, errno
+from libc.string cimport memchr
+from posix.unistd cimport read
+
+cdef extern from '<errno.h>':
+    int EWOULDBLOCK
+
+
+def drain(int fd, unsigned char[::1] view, bytearray carry):
+    """
+    Reads everything available on the nonblocking fd through the buffer view
+    into carry, and returns the complete messages received as strings.
+    The trailing incomplete line is kept in carry for the next call.
+    """
+    cdef Py_ssize_t size = view.shape[0]
+    cdef Py_ssize_t n, last, start, end, s, e
+    cdef char *buf = <char *>&view[0]
+    cdef char *data
+    cdef char *nl
+    cdef Py_ssize_t kept = PyByteArray_GET_SIZE(carry)
+    cdef list msgs = []
+
+    while True:
+        n = read(fd, buf, size)
+        if n < 0:
+            if errno == EINTR:
+                PyErr_CheckSignals()
+                continue
+            if errno == EAGAIN or errno == EWOULDBLOCK:
+                break
+            PyErr_SetFromErrno(OSError)
+        carry += buf[:n]
+        if n < size:    # a short read means the pipe is empty for now
+            break
+
+    n = PyByteArray_GET_SIZE(carry)
+    if n == kept:   # spurious wakeup, nothing new to tokenize
+        return msgs
+    data = PyByteArray_AS_STRING(carry)
+    last = n    # end of the last complete line
+    while last > 0 and data[last - 1] != b'\n':
+        last -= 1
+    start = 0
+    try:
+        while start < last:
+            nl = <char *>memchr(data + start, b'\n', last - start)
+            end = nl - data
+            s = start
+            e = end
+            if e > s and data[e - 1] == b'\r':
+                e -= 1
+            while s < e and (data[s] == b' ' or data[s] == b'\t'):
+                s += 1
+            while e > s and (data[e - 1] == b' ' or data[e - 1] == b'\t'):
+                e -= 1
+            if e > s:
+                msgs.append(PyUnicode_DecodeUTF8(data + s, e - s, NULL))
+            start = end + 1
+    finally:
+        # Like the pure python version, complete lines are consumed even if
+        # one of them fails to decode.
+        del carry[:last]
+    return msgs
@@ -24,16 +24,31 @@
 #    FROM,  OUT  OF  OR  IN  CONNECTION WITH THE SOFTWARE OR THE  USE  OR  OTHER
 #    DEALINGS IN THE SOFTWARE.
 #
+import atexit
+import fcntl
 import os
 import re
-
-from errno import EAGAIN, ENOENT, ENXIO, EWOULDBLOCK
-from os.path import exists, join
+import selectors
+import struct
+import weakref
+
+from errno import EAGAIN, ENOENT, ENXIO, EPIPE, EWOULDBLOCK
+from functools import lru_cache, partial
+from os.path import join
+from select import PIPE_BUF, POLLOUT, poll
 from stat import S_ISFIFO
 from time import monotonic, sleep
 
+try:    # python3.8 and above
+    from multiprocessing import resource_tracker
+    from multiprocessing.shared_memory import SharedMemory
+except ImportError:
+    SharedMemory = None
+
 RE_TYPE = type(re.compile(''))  # for python3.6/3.7 compatibility
 FIFO_ROOT = '/tmp'
+SHM_ROOT = '/dev/shm'
+PIPE_SIZE = 65536                # default pipe capacity on linux
 
 
 class FifoDoesNotExistError(Exception):
@@ -44,6 +59,7 @@ class FifoDoesNotExistError(Exception):
     """
     def __init__(self,name):
         self.message = f'The named pipe {name} does not exist.'
+        super().__init__(self.message)
 
 
 class NotFifoError(Exception):
@@ -53,11 +69,98 @@ class NotFifoError(Exception):
     """
     def __init__(self, name):
         self.message=f'{name} is not a named pipe.'
+        super().__init__(self.message)
 
 
 class Quit(Exception): pass
 
 
+def _matcher(pattern):
+    """
+    Returns the method used to match messages against a compiled pattern.
+    Patterns anchored at the end use fullmatch, which fails as soon as the
+    message cannot match to its end instead of relying on the $ anchor.
+    Alternations are left alone since $ may anchor only one branch, and so
+    are multiline patterns and verbose ones, where $ may be in a comment.
+    """
+    source = pattern.pattern
+    if isinstance(source, bytes):
+        source = source.decode('latin-1')
+    escapes = len(source[:-1]) - len(source[:-1].rstrip('\\'))
+    if (source.endswith('$') and not escapes % 2 and '|' not in source
+            and not pattern.flags & (re.MULTILINE|re.VERBOSE)):
+        return pattern.fullmatch
+    return pattern.match
+
+
+def _pack(msgs):
+    """
+    Packs messages into lines of utf-8 bytes, and yields them in chunks of
+    up to PIPE_BUF bytes each with the number of messages in it.
+    """
+    chunk, count = bytearray(), 0
+    for msg in msgs:
+        if isinstance(msg, str):
+            msg = msg.encode()
+        if chunk and len(chunk) + len(msg) + 1 > PIPE_BUF:
+            yield count, chunk
+            chunk, count = bytearray(), 0
+        chunk += msg
+        chunk.append(0x0A)
+        count += 1
+    if chunk:
+        yield count, chunk
+
+
+def _drain(fd, view, carry):
+    """
+    Reads everything available on the nonblocking fd through the buffer view
+    into carry, and returns the complete messages received as strings.
+    The trailing incomplete line is kept in carry for the next call.
+    """
+    bufs = [view]
+    size = len(view)
+    kept = len(carry)
+    while True:
+        try:
+            n = os.readv(fd, bufs)
+        except OSError as err:
+            if err.errno != EAGAIN and err.errno != EWOULDBLOCK:
+                raise
+            break
+        carry += view[:n]
+        if n < size:    # a short read means the pipe is empty for now
+            break
+    if len(carry) == kept:  # spurious wakeup, nothing new to tokenize
+        return []
+    return _split(carry)
+
+
+def _split(carry):
+    """
+    Removes the complete lines from carry and returns them as messages.
+    """
+    end = carry.rfind(b'\n') + 1
+    lines = carry[:end].split(b'\n')
+    del carry[:end]
+    msgs = []
+    for line in lines:
+        # Same as the compiled version: drop the CR of a CRLF ending, then
+        # the surrounding blanks.
+        if line.endswith(b'\r'):
+            line = line[:-1]
+        line = line.strip(b' \t')
+        if line:
+            msgs.append(line.decode('utf-8'))
+    return msgs
+
+
+try:    # use the compiled version when the extension is built
+    from ._fifocator import drain as _drain
+except ImportError:
+    pass
+
+
 class FifoWorker:
     """
     Invoke a worker that waits for messages sent over named pipes. Messages are
@@ -71,7 +174,10 @@ class FifoWorker:
     def __init__(self, name):
         self.original = name
         self.subscribers = []
+        self._exact = {}        # message -> (order, callback)
+        self._regex = []        # [(order, pattern.match, callback)]
         self.wildcard = None
+        self._match = None      # compiled on demand, see _compile()
         if name[0] != os.sep:
             name = join(FIFO_ROOT, name)
         self.name = name
@@ -89,19 +195,26 @@ class FifoWorker:
         received.
 
         Only the first subscription that matches a message will be invoked.
- 
-        OPTIMIZATION HINT: First subscribe to empty messages as they are
-        the most common:
+
+        OPTIMIZATION HINT: String subscriptions are looked up directly, but
+        every regular expression subscribed before a string is tried first,
+        so subscribe to regular expressions last when possible:
 
         myfifo.sub(f0, '')
         myfifo.sub(f1, 'msg1')
-        myfifo.sub(f2, 'msg2')
+        myfifo.sub_re(f2, '^msg.*$')
         ...
         """
-        if msg != None:
-            self.subscribers += ((type(msg) != RE_TYPE, msg, callback),)
-        elif self.wildcard == None:
+        if msg is not None:
+            order = len(self.subscribers)
+            self.subscribers.append((not isinstance(msg, RE_TYPE), msg, callback))
+            if isinstance(msg, RE_TYPE):
+                self._regex.append((order, _matcher(msg), callback))
+            else:
+                self._exact.setdefault(msg, (order, callback))
+        elif self.wildcard is None:
             self.wildcard = callback
+        self._match = None
 
 
     def sub_re(self, callback, msg):
@@ -115,13 +228,43 @@ class FifoWorker:
         """
         Emit call to the callback subscribed to msg.
         """
-        for sub in self.subscribers:
-            if sub[0] and sub[1] == msg or not sub[0] and re.match(sub[1], msg):
-                sub[2](msg, self.original)
-                break
-        else:
-            if self.wildcard:
-                self.wildcard(msg, self.original)
+        match = self._match
+        if match is None:
+            match = self._compile()
+        callback = match(msg)
+        if callback:
+            callback(msg, self.original)
+
+
+    def _compile(self):
+        """
+        Generates the function that returns the callback subscribed to a
+        message, or None, with the regular expressions unrolled into
+        straight-line tests, e.g.:
+
+        def resolve(msg, _get=_get, _miss=_miss, _m0=_m0, _c0=_c0):
+            order, callback = _get(msg, _miss)
+            if 2 < order and _m0(msg):
+                return _c0
+            return callback
+
+        Messages repeat a lot, so self._match caches what each resolved to.
+        It is generated when the first message is emitted after sub(), so
+        subscribing many times in a row stays cheap.
+        """
+        env = {'_get': self._exact.get, '_miss': (len(self.subscribers), self.wildcard)}
+        args = ['msg', '_get=_get', '_miss=_miss']
+        body = ['    order, callback = _get(msg, _miss)']
+        for i, (order, match, callback) in enumerate(self._regex):
+            env[f'_m{i}'] = match
+            env[f'_c{i}'] = callback
+            args += [f'_m{i}=_m{i}', f'_c{i}=_c{i}']
+            body += [f'    if {order} < order and _m{i}(msg):',
+                     f'        return _c{i}']
+        body += ['    return callback']
+        exec(f"def resolve({', '.join(args)}):\n" + '\n'.join(body), env)
+        self._match = lru_cache(maxsize=1024)(env['resolve'])
+        return self._match
 
 
     def run(self, interval):
@@ -129,31 +272,54 @@ class FifoWorker:
         Main loop, listen to named pipe and emit calls on each message.
         Before starting, first ensures that the named pipe exists.
 
+        Messages are dispatched as soon as they arrive; interval is how long
+        to wait for one before emitting the empty message.
+
         Exit the main loop by raising the exception Quit.
         """
-        if not exists(self.name):
-            umask=os.umask(0o000)
+        umask=os.umask(0o000)
+        try:
             os.mkfifo(self.name,mode=0o666)
+        except FileExistsError:
+            if not S_ISFIFO(os.stat(self.name).st_mode):
+                raise NotFifoError(self.name)
+        finally:
             os.umask(umask)
-        elif not S_ISFIFO(os.stat(self.name).st_mode):
-            raise NotFifoError(self.name)
 
-        fifo = os.open(self.name, os.O_RDONLY|os.O_NONBLOCK)
+        sel = selectors.DefaultSelector()
+        fifo = keepalive = -1
         try:
+            fifo = os.open(self.name, os.O_RDONLY|os.O_NONBLOCK)
+            # Hold a write end of our own so the pipe never reports EOF when
+            # the last client closes, otherwise it would stay readable and spin.
+            keepalive = os.open(self.name, os.O_WRONLY|os.O_NONBLOCK)
+            sel.register(fifo, selectors.EVENT_READ)
+            # Bind everything the loop touches to locals, it runs per message.
+            select = sel.select
+            drain = self._reader(fifo)
+            emit = self.emit
             while True:
-                try:
-                    _msg = os.read(fifo,9999).decode('utf-8').strip()
-                except OSError as err:
-                    if err.errno == EAGAIN or err.errno == EWOULDBLOCK:
-                        _msg = ''
-                    else:
-                        raise
-                for msg in _msg.split('\n'):
-                    self.emit(msg.strip())
-                sleep(interval)
+                if not select(interval):
+                    emit('')
+                    continue
+                for msg in drain():
+                    emit(msg)
         except Quit:
             pass
-        os.close(fifo)
+        finally:
+            sel.close()
+            if keepalive >= 0:
+                os.close(keepalive)
+            if fifo >= 0:
+                os.close(fifo)
+
+
+    def _reader(self, fifo):
+        """
+        Returns a callable that reads and returns the messages available on
+        the named pipe, called by run() whenever the pipe becomes readable.
+        """
+        return partial(_drain, fifo, memoryview(bytearray(PIPE_SIZE)), bytearray())
 
 
     def quit(self, *args, **kwargs):
@@ -165,7 +331,8 @@ class FifoWorker:
 
 class FifoClient:
 
-    def __init__(self, name, retries = 3, retry_interval = 0.1, guarantee_delivery = False):
+    def __init__(self, name, retries = 3, retry_interval = 0.1, guarantee_delivery = False,
+                 batch_size = 64, flush_interval = 0.1):
         """
         name - the name of the named pipe, if not provided with an absolute
             path then it is assumed to be under /tmp
@@ -177,6 +344,12 @@ class FifoClient:
         gurantee_delivery - if True and writing to the pipe fails after
             retries then raise an exception; otherwise drop the message,
             and don't retry in subsequent writes until another write suceeds
+
+        batch_size - number of messages queued by write_buffered that
+            triggers a flush
+
+        flush_interval - time in seconds since the last flush after which
+            write_buffered flushes the queue
         """
         self.original = name
         if name[0] != os.sep:
@@ -186,32 +359,442 @@ class FifoClient:
         self.retries_save = retries
         self.retry_interval = retry_interval
         self.guarantee_delivery = guarantee_delivery
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._pending = []
+        self._last_flush = monotonic()
+        self._fd = -1
+        _clients.add(self)
 
 
     def write(self, msg):
         """
-        Writes a message to a named pipe.
+        Writes a message to a named pipe. The message is a string, or bytes
+        that are already utf-8 encoded.
+        """
+        if isinstance(msg, str):
+            msg = msg.encode()  # utf-8, the default codec is the fast path
+        self._write(msg + b'\n')
+
+
+    def write_many(self, msgs):
+        """
+        Writes several messages to a named pipe, opening it only once.
+
+        Messages are packed into writes of up to PIPE_BUF bytes, which are
+        never interleaved with writes of other clients. A message above
+        PIPE_BUF gets a write of its own.
+
+        Each write is delivered whole or not at all, but if this raises the
+        writes before it may already be delivered, so part of msgs may have
+        reached the worker. Use write_buffered() and flush() to retry only
+        the messages not written yet.
+        """
+        chunks = [chunk for _, chunk in _pack(msgs)]
+        if chunks:
+            self._write(*chunks)
+
+
+    def write_buffered(self, msg):
+        """
+        Queues a message, and writes the queue with write_many once it holds
+        batch_size messages or flush_interval seconds passed since the last
+        flush. Call flush() to write out messages still in the queue.
+
+        If the flush fails the messages not written yet, including msg,
+        stay queued for the next flush.
+        """
+        self._pending.append(msg)
+        if (len(self._pending) >= self.batch_size
+                or monotonic() - self._last_flush >= self.flush_interval):
+            self.flush()
+
+
+    def flush(self):
+        """
+        Writes out the messages queued by write_buffered. Messages are only
+        removed from the queue once written, so they are not lost if a write
+        raises, and since a write that raises delivered none of its messages
+        calling flush() again does not duplicate them.
+        """
+        self._last_flush = monotonic()
+        for count, chunk in list(_pack(self._pending)):
+            self._write(chunk)
+            del self._pending[:count]
+
+
+    def close(self):
+        """
+        Flushes queued messages and closes the named pipe. Called at exit
+        for clients still alive, or use the client as a context manager:
+
+        with FifoClient('my_fifo_file') as my_client:
+            my_client.write_buffered('something')
+
+        A client that is garbage collected only releases its descriptors,
+        messages still queued by write_buffered are lost.
+        """
+        try:
+            self.flush()
+        finally:
+            self._release()
+
+
+    def __enter__(self):
+        return self
+
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+    def __del__(self):
+        self._release()
+
+
+    def _release(self):
+        if getattr(self, '_fd', -1) >= 0:
+            os.close(self._fd)
+            self._fd = -1
+
+
+    def _retry(self):
+        """
+        Waits before retrying a write the worker is not ready for. Returns
+        False if the message should be dropped instead.
+        """
+        if self.retries:
+            self.retries -= 1
+            sleep(self.retry_interval)
+            return True
+        elif self.guarantee_delivery:
+            raise FifoDoesNotExistError(self.name)
+        return False
+
+
+    def _open(self):
+        """
+        Opens the named pipe, waiting for a worker as configured. Returns
+        False if the message should be dropped.
         """
-        fifo = None
         while True:
             try:
-                fifo = os.open(self.name, os.O_WRONLY|os.O_NONBLOCK)
+                self._fd = os.open(self.name, os.O_WRONLY|os.O_NONBLOCK)
+                return True
             except OSError as err:
                 if err.errno != ENXIO and err.errno != ENOENT:
                     raise
-                else:
-                    if self.retries:
-                        self.retries -= 1
-                        sleep(self.retry_interval)
-                    elif self.guarantee_delivery:
-                        raise PipeDoesNotExistError(self.name)
-                    else:   # drop message
-                        break
-            else:
-                self.retries = self.retries_save
-                os.write(fifo, (msg+'\n').encode('utf-8'))
-                break
+                if not self._retry():
+                    return False
+
+
+    def _write(self, *chunks):
+        # The pipe is kept open between writes and only reopened once the
+        # worker on the other side goes away.
+        i = 0
+        while i < len(chunks):
+            if self._fd < 0 and not self._open():
+                return  # drop message
+            try:
+                while i < len(chunks):
+                    self._write_chunk(chunks[i])
+                    i += 1
+            except BrokenPipeError:
+                os.close(self._fd)
+                self._fd = -1
+        self.retries = self.retries_save
+
+
+    def _write_chunk(self, chunk):
+        """
+        Writes a whole chunk. If the pipe is full wait for the worker to make
+        room, up to retries times retry_interval, then raise BlockingIOError
+        with nothing written.
+
+        Writes above PIPE_BUF may be short, and once part of a chunk is in
+        the pipe the rest must follow or the worker would join it with the
+        next message. So from then on wait as long as the worker keeps the
+        pipe open; if it goes away the write raises EPIPE and the whole chunk
+        is written again to the next worker.
+        """
+        try:
+            n = os.write(self._fd, chunk)
+        except BlockingIOError:
+            n = 0
+        if n == len(chunk):
+            return
+        view = memoryview(chunk)
+        writable = poll()
+        writable.register(self._fd, POLLOUT)
+        retries = self.retries_save
+        while n < len(chunk):
+            if not n:
+                if not retries:
+                    raise BlockingIOError(EAGAIN, 'The named pipe is full')
+                retries -= 1
+            writable.poll(self.retry_interval * 1000)
+            try:
+                n += os.write(self._fd, view[n:])
+            except BlockingIOError:
+                pass
+
+
+# Clients still alive at exit are closed so that queued messages are written,
+# without keeping short-lived clients from being collected.
+_clients = weakref.WeakSet()
+
+
+@atexit.register
+def _close_clients():
+    for client in list(_clients):
+        client.close()
+
+
+class _Ring:
+    """
+    A byte ring buffer in a named shared memory segment, holding the same
+    newline separated messages that would otherwise be written to the pipe.
+
+    The segment starts with the head and tail offsets as free running
+    counters, followed by the ring itself. Both counters are only accessed
+    under flock on the segment, which serializes writers and doubles as a
+    memory barrier between processes.
+    """
+    HEADER = struct.Struct('QQ')    # head, tail
+    HEAD = struct.Struct('Q')       # head alone, for the reader to advance it
+
+    def __init__(self, name, size=0):
+        """
+        Attach to the segment name, or create it with size bytes if size is
+        given and it does not exist yet.
+        """
+        if SharedMemory is None:
+            raise RuntimeError('Shared memory rings require python3.8 or above')
+        self.shm = None
+        if size:
+            try:
+                self.shm = self._open(name, True, size)
+            except FileExistsError:
+                pass
+        if self.shm is None:
+            self.shm = self._open(name, False, 0)
+        self.lock = os.open(join(SHM_ROOT, name), os.O_RDWR)
+        self.buf = self.shm.buf
+        self.capacity = self.shm.size - self.HEADER.size
+
+
+    @staticmethod
+    def _open(name, create, size):
+        # The segment must outlive the process that created it, like the
+        # named pipe does, so keep it away from the resource tracker.
+        try:
+            return SharedMemory(name, create=create, size=size, track=False)
+        except TypeError:   # python < 3.13
+            shm = SharedMemory(name, create=create, size=size)
+            resource_tracker.unregister(shm._name, 'shared_memory')
+            return shm
+
+
+    def put(self, chunks):
+        """
+        Appends chunks to the ring as one unit, and returns True if the ring
+        was empty before. Raises BlockingIOError if they do not fit, and
+        FileNotFoundError if the segment was unlinked since it was attached.
+        """
+        size = sum(len(chunk) for chunk in chunks)
+        fcntl.flock(self.lock, fcntl.LOCK_EX)
+        try:
+            if not os.fstat(self.lock).st_nlink:
+                raise FileNotFoundError(ENOENT, 'Shared memory ring was unlinked')
+            head, tail = self.HEADER.unpack_from(self.buf)
+            if size > self.capacity - (tail - head):
+                raise BlockingIOError(EAGAIN, 'Shared memory ring is full')
+            pos = tail
+            for chunk in chunks:
+                self._copy_in(pos, chunk)
+                pos += len(chunk)
+            self.HEADER.pack_into(self.buf, 0, head, pos)
+        finally:
+            fcntl.flock(self.lock, fcntl.LOCK_UN)
+        return head == tail
+
+
+    def get(self, carry):
+        """
+        Moves everything in the ring to the end of carry, and returns False
+        if the ring was empty.
+        """
+        fcntl.flock(self.lock, fcntl.LOCK_EX)
+        try:
+            head, tail = self.HEADER.unpack_from(self.buf)
+        finally:
+            fcntl.flock(self.lock, fcntl.LOCK_UN)
+        if head == tail:
+            return False
+        start = self.HEADER.size + head % self.capacity
+        end = self.HEADER.size + tail % self.capacity
+        if start < end:
+            carry += self.buf[start:end]
+        else:   # wraps around
+            carry += self.buf[start:]
+            carry += self.buf[self.HEADER.size:end]
+        fcntl.flock(self.lock, fcntl.LOCK_EX)
+        try:
+            self.HEAD.pack_into(self.buf, 0, tail)
+        finally:
+            fcntl.flock(self.lock, fcntl.LOCK_UN)
+        return True
+
+
+    def _copy_in(self, pos, data):
+        start = self.HEADER.size + pos % self.capacity
+        first = min(len(data), self.HEADER.size + self.capacity - start)
+        self.buf[start:start+first] = data[:first]
+        if first < len(data):   # wraps around
+            rest = len(data) - first
+            self.buf[self.HEADER.size:self.HEADER.size+rest] = data[first:]
+
+
+    def close(self):
+        self.buf = None
+        self.shm.close()
+        os.close(self.lock)
+
+
+    @staticmethod
+    def unlink(name):
+        try:
+            os.unlink(join(SHM_ROOT, name))
+        except FileNotFoundError:
+            pass
+
+
+def _shm_name(path):
+    return 'fifocator' + path.replace(os.sep, '.')
+
+
+class SharedRingFifo(FifoWorker):
+    """
+    A worker that receives messages through a ring buffer in shared memory
+    instead of the named pipe, so that message data does not go through
+    the kernel. Send messages with SharedRingClient.
+
+    The named pipe is still created and used as a doorbell: clients write
+    to it only when they put messages into an empty ring, so the worker can
+    keep waiting for it as usual. Lines written directly to the named pipe,
+    e.g. with echo, are received as well.
+
+    The segment outlives the worker like the named pipe does, so messages
+    put while no worker runs are received by the next one. It takes size
+    bytes of memory until it is removed with unlink().
+
+    Requires python3.8 or above.
+    """
+
+    def __init__(self, name, size=1<<20):
+        """
+        size - size in bytes of the shared memory segment, used only if
+            the worker creates it
+        """
+        super().__init__(name)
+        self.size = size
+        self.shm_name = _shm_name(self.name)
+
+
+    def run(self, interval):
+        """
+        Same as FifoWorker.run, after creating or attaching to the shared
+        memory segment.
+        """
+        self.ring = _Ring(self.shm_name, self.size)
+        try:
+            super().run(interval)
+        finally:
+            self.ring.close()
+
+
+    def unlink(self):
+        """
+        Removes the shared memory segment, e.g. after run() returns. Messages
+        still in the ring are lost, and clients attached to it attach to a
+        new segment on their next write.
+        """
+        _Ring.unlink(self.shm_name)
+
+
+    def _reader(self, fifo):
+        pipe = super()._reader(fifo)
+        ring = self.ring
+        carry = bytearray()
+        if ring.get(carry):     # clients left messages while we were away
+            doorbell = os.open(self.name, os.O_WRONLY|os.O_NONBLOCK)
+            try:
+                os.write(doorbell, b'\n')
             finally:
-                if fifo:
-                    os.close(fifo)
+                os.close(doorbell)
+
+        def drain():
+            # Empty the pipe first, so that clients ringing the doorbell
+            # after the ring is found empty below wake us up again.
+            msgs = pipe()
+            while ring.get(carry):
+                pass
+            msgs += _split(carry)
+            return msgs
+        return drain
+
+
+class SharedRingClient(FifoClient):
+    """
+    A client for SharedRingFifo, with the same interface as FifoClient.
+
+    Writes raise BlockingIOError when the ring is full, just like writes to
+    a full named pipe would.
+    """
+
+    def __init__(self, name, *args, **kwargs):
+        super().__init__(name, *args, **kwargs)
+        self.shm_name = _shm_name(self.name)
+        self._ring = None
+
+
+    def _release(self):
+        super()._release()
+        if getattr(self, '_ring', None):
+            self._ring.close()
+            self._ring = None
+
 
+    def _write(self, *chunks):
+        while True:
+            try:
+                if self._ring is None:
+                    self._ring = _Ring(self.shm_name)
+                empty = self._ring.put(chunks)
+                break
+            except FileNotFoundError:
+                if self._ring is not None:  # unlinked, attach to the new one
+                    self._ring.close()
+                    self._ring = None
+                    continue
+                if not self._retry():
+                    return  # drop message
+        if empty:
+            self._doorbell()
+        self.retries = self.retries_save
+
+
+    def _doorbell(self):
+        # If there is no worker to wake up the messages wait in the ring.
+        try:
+            if self._fd < 0:
+                self._fd = os.open(self.name, os.O_WRONLY|os.O_NONBLOCK)
+            os.write(self._fd, b'\n')
+        except BlockingIOError:
+            pass    # the worker has unread doorbells already
+        except OSError as err:
+            if err.errno not in (ENXIO, ENOENT, EPIPE):
+                raise
+            if self._fd >= 0:
+                os.close(self._fd)
+                self._fd = -1
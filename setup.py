@@ -1,11 +1,24 @@
 #!/usr/bin/python3
 
-from setuptools import setup
+from setuptools import Extension, setup
 from fifocator import __version__
 
+# The compiled message tokenizer is optional, fifocator falls back to pure
+# python when it is not built.
+try:
+    from Cython.Build import cythonize
+    ext_modules = cythonize(
+        [ Extension('fifocator._fifocator', [ 'fifocator/_fifocator.pyx' ],
+                    extra_compile_args = [ '-O3' ]) ],
+        compiler_directives = { 'language_level': 3 })
+except ImportError:
+    ext_modules = []
+
 setup(
     name = 'fifocator',
     packages = [ 'fifocator' ],
+    package_data = { 'fifocator': [ '_fifocator.pyx' ] },
+    ext_modules = ext_modules,
     version = __version__,
     description = 'Named pipes made easy',
     license = 'MIT',
@@ -42,6 +42,17 @@
 # $ sort w1.log > w.log
 # $ diff w.log c.log
 #
+# 3. Shared Memory Ring Testing
+# -----------------------------
+#
+# Run the same procedures with the worker and the clients passing their
+# messages through a shared memory ring, by adding ring to the arguments:
+# $ python3.8 test.py ring worker > w1.log &
+# $ python3.8 test.py ring > c1.log &
+# ...
+#
+# Quitting the worker also removes the ring from /dev/shm.
+#
 # NOTES:
 # ------
 #
@@ -83,17 +94,17 @@ def mk_load(n):
     """
     n = distort(n,0.1)
     k = 1.1
-    while n:
-        n -= 1
+    limit = sys.maxsize/2
+    for _ in range(n):
         k *= 1.1
-        if k > sys.maxsize/2:
+        if k > limit:
             k = 1.1
     return k
 
 
-def client():
+def client(Client=fifocator.FifoClient):
     global fifo
-    fifo = fifocator.FifoClient(FIFO_NAME)
+    fifo = Client(FIFO_NAME)
     n = distort(XMISSIONS_PER_CLIENT)
     while n:
         n -= 1
@@ -107,7 +118,7 @@ def client():
         sleep(INTERVAL_BETWEEN_XMISSIONS)
 
 
-def worker():
+def worker(Worker=fifocator.FifoWorker):
     global fifo
 
     def _worker(msg, name):
@@ -124,7 +135,7 @@ def worker():
     def _never_called(msg, name):
         print('Holly bologna o_O')
 
-    fifo = fifocator.FifoWorker(FIFO_NAME)
+    fifo = Worker(FIFO_NAME)
     fifo.sub(_wildcard)
     fifo.sub(_worker, '')
     fifo.sub(_worker, 'X-----')
@@ -139,14 +150,23 @@ def worker():
     except KeyboardInterrupt:
         print('Stopped by CTRL-C')
         exit()
+    finally:
+        if Worker is fifocator.SharedRingFifo:
+            fifo.unlink()
 
 
 if __name__ == '__main__':
     random.seed()
-    if len(sys.argv) == 2 and sys.argv[1] == 'worker':
-        worker()
-    elif len(sys.argv) == 1:
-        client()
+    args = sys.argv[1:]
+    if args[:1] == ['ring']:
+        args = args[1:]
+        Worker, Client = fifocator.SharedRingFifo, fifocator.SharedRingClient
+    else:
+        Worker, Client = fifocator.FifoWorker, fifocator.FifoClient
+    if args == ['worker']:
+        worker(Worker)
+    elif not args:
+        client(Client)
     else:
-        print('test.py [worker]')
+        print('test.py [ring] [worker]')
 